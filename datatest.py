@@ -1,26 +1,159 @@
+import os
+
+import numpy as np
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# PyArrow is optional; fall back to the pandas CSV parser when it is missing
+try:
+    import pyarrow.csv as pv
+    import pyarrow.dataset as ds
+except ImportError:
+    pv = None
+    ds = None
+
+# Numba is optional; fall back to pandas' fill methods when it is missing
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# NumExpr is optional; fall back to plain NumPy arithmetic when it is missing
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# joblib is optional; fall back to processing battery files one after another when it is missing
+try:
+    from joblib import Parallel, delayed
+except ImportError:
+    Parallel = None
+
+
+# Signals used by the analysis; all other signal rows are skipped while reading
+REQUIRED_SIGNALS = ['PW_EnergyRemaining', 'PW_FullPackEnergyAvailable', 'PW_AvailableChargePower']
+
+# Number of CSV rows processed at a time when loading battery data
+CHUNK_SIZE = 1_000_000
+# Bytes per PyArrow read block (roughly CHUNK_SIZE rows of battery telemetry)
+BLOCK_SIZE = 64 * 1024 * 1024
+
+# Range of plausible telemetry timestamps; anything outside is treated as corrupt
+MIN_TIMESTAMP = np.datetime64('2000-01-01')
+MAX_TIMESTAMP = np.datetime64('2100-01-01')
+# Integer encoding of NaT, used for missing timestamps so they fall outside the range above
+NAT_MS = np.iinfo(np.int64).min
+
+# Maximum number of SOE values drawn in the distribution plot; larger inputs are sampled down
+MAX_PLOT_SAMPLES = 200_000
+
+
+# Read the required signal rows of a battery CSV file in chunks,
+# so the long-format data never sits in memory at once
+def read_battery_chunks(file_path):
+    if pv is not None:
+        # Stream record batches with PyArrow's multithreaded reader and keep the Arrow buffers,
+        # filtering signal rows during the scan so unused ones never reach pandas
+        csv_format = ds.CsvFileFormat(
+            read_options=pv.ReadOptions(block_size=BLOCK_SIZE),
+            convert_options=pv.ConvertOptions(column_types={
+                'timestamp': 'int64',
+                'signal_name': 'string',
+                'signal_value': 'float32',
+            }),
+        )
+        scanner = ds.dataset(file_path, format=csv_format).scanner(
+            columns=['timestamp', 'signal_name', 'signal_value'],
+            filter=ds.field('signal_name').isin(REQUIRED_SIGNALS),
+            batch_size=CHUNK_SIZE,
+        )
+        for batch in scanner.to_batches():
+            chunk = batch.to_pandas(types_mapper=pd.ArrowDtype)
+            # Encode signal names as categories so later steps compare integer codes
+            chunk['signal_name'] = pd.Categorical(chunk['signal_name'], categories=REQUIRED_SIGNALS)
+            yield chunk
+    else:
+        for chunk in pd.read_csv(file_path, chunksize=CHUNK_SIZE,
+                                 usecols=['timestamp', 'signal_name', 'signal_value'],
+                                 dtype={'signal_value': np.float32}):
+            # Encode signal names as categories; signals outside REQUIRED_SIGNALS become NaN and are dropped
+            chunk['signal_name'] = pd.Categorical(chunk['signal_name'], categories=REQUIRED_SIGNALS)
+            yield chunk[chunk['signal_name'].notna()]
+
+
+# Forward fill each column of a 2-D float array in place, then backward fill its leading NaNs
+if numba is not None:
+    @numba.njit(parallel=True)
+    def fill_gaps(values, backward=True):
+        for col in numba.prange(values.shape[1]):
+            # Carry the last valid reading down the column in a single pass
+            first_valid = -1
+            last = np.nan
+            for row in range(values.shape[0]):
+                if np.isnan(values[row, col]):
+                    values[row, col] = last
+                else:
+                    last = values[row, col]
+                    if first_valid < 0:
+                        first_valid = row
+            # Rows before the first reading take its value
+            if backward and first_valid > 0:
+                values[:first_valid, col] = values[first_valid, col]
+        return values
+else:
+    def fill_gaps(values, backward=True):
+        filled = pd.DataFrame(values).ffill()
+        if backward:
+            filled = filled.bfill()
+        values[:] = filled.to_numpy()
+        return values
+
 
 # Load the data for a given battery and convert timestamps
 def load_battery_data(file_path):
-    # Read CSV file into a DataFrame
-    df = pd.read_csv(file_path)
-    # Convert Unix epoch time in milliseconds to datetime format
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', errors='coerce')
-    # Remove rows with invalid timestamps (e.g., NaT)
-    df.dropna(subset=['timestamp'], inplace=True)
-    # Set timestamp as the index for easy resampling
-    df.set_index('timestamp', inplace=True)
-    # Pivot the data to have signal names as columns and timestamps as index
-    df = df.pivot(columns='signal_name', values='signal_value')
-    # Forward fill to handle missing values due to irregular sampling
-    df.ffill(inplace=True)
-    # Backward fill to handle initial NaNs
-    df.bfill(inplace=True)
-    # Drop any remaining NaNs after filling
-    df.dropna(inplace=True)
+    # Reuse the cached wide DataFrame when it is newer than the CSV file
+    cache_path = file_path + '.pq'
+    if pv is not None and os.path.exists(cache_path) and os.path.getmtime(cache_path) > os.path.getmtime(file_path):
+        return pd.read_parquet(cache_path)
+    pivoted_chunks = []
+    # Read CSV file chunk by chunk, keeping signal values as float32
+    for chunk in read_battery_chunks(file_path):
+        # Reinterpret Unix epoch time in milliseconds as datetimes without parsing each value
+        timestamps = chunk['timestamp'].to_numpy(dtype=np.int64, na_value=NAT_MS).view('datetime64[ms]')
+        # Remove rows with missing or out-of-range timestamps
+        valid = (timestamps >= MIN_TIMESTAMP) & (timestamps < MAX_TIMESTAMP)
+        chunk = chunk[valid].assign(timestamp=timestamps[valid])
+        # Reshape the chunk to have signal names as columns and timestamps as index,
+        # grouping on the categorical signal codes
+        pivoted = (chunk.groupby(['timestamp', 'signal_name'], observed=True)['signal_value']
+                   .last()
+                   .unstack(level='signal_name'))
+        pivoted_chunks.append(pivoted)
+    # Stitch the chunks together and sort by timestamp once, which is only a check for
+    # time-ordered logs, so the fill and monthly reductions work on a monotonic index
+    df = pd.concat(pivoted_chunks)
+    if not df.index.is_monotonic_increasing:
+        df.sort_index(kind='stable', inplace=True)
+    # Merge timestamps that were split across chunk boundaries
+    if df.index.has_duplicates:
+        df = df.groupby(level=0, sort=False).last()
+    # Forward fill missing values due to irregular sampling and backward fill initial NaNs
+    values = fill_gaps(df.to_numpy(dtype=np.float32, copy=True, na_value=np.nan))
+    # Use plain string signal names as column labels so the frame can be stored as Parquet
+    df = pd.DataFrame(values, index=df.index, columns=df.columns.astype(str))
+    # Only signals that were never recorded still hold NaNs, which leaves no complete rows
+    if np.isnan(values[:1]).any():
+        df = df.iloc[:0]
+    # Cache the wide DataFrame as Parquet so later runs skip parsing, pivoting and filling
+    if pv is not None:
+        try:
+            df.to_parquet(cache_path, compression='zstd')
+        except OSError:
+            # The data directory may be read-only; the cache is only an optimisation
+            pass
     return df
 
 
@@ -28,40 +161,130 @@ def load_battery_data(file_path):
 def calculate_soe(df):
     # Check if the necessary columns are present to calculate SOE
     if 'PW_EnergyRemaining' in df.columns and 'PW_FullPackEnergyAvailable' in df.columns:
-        # Calculate SOE as the percentage of energy remaining relative to full capacity
-        df['SOE'] = (df['PW_EnergyRemaining'] / df['PW_FullPackEnergyAvailable']) * 100
+        energy = df['PW_EnergyRemaining'].to_numpy()
+        capacity = df['PW_FullPackEnergyAvailable'].to_numpy()
+        # Calculate SOE as the percentage of energy remaining relative to full capacity,
+        # leaving it undefined where the full pack energy is not positive
+        if numexpr is not None:
+            soe = numexpr.evaluate('where(b > 0, a / b * 100, nan)',
+                                   local_dict={'a': energy, 'b': capacity, 'nan': np.float32(np.nan)})
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                soe = np.where(capacity > 0, energy / capacity * 100, np.nan)
         # Forward fill to handle NaN values in SOE calculation
-        df['SOE'] = df['SOE'].ffill()
+        df['SOE'] = fill_gaps(soe[:, np.newaxis], backward=False)[:, 0]
         # Drop rows where SOE calculation failed (resulted in NaN)
         df.dropna(subset=['SOE'], inplace=True)
     return df
 
 
+# Average a per-row 0/1 flag into a monthly percentage, labelled by month end like resample('ME')
+def monthly_percentage(months, flags):
+    if len(months) == 0:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+    # Bucket rows by their offset from the first month, so each month is a bincount slot
+    first_month = months.min()
+    codes = months - first_month
+    totals = np.bincount(codes, weights=flags)
+    counts = np.bincount(codes)
+    # Months without any readings come out as NaN, matching resample
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = 100.0 * totals / counts
+    month_ends = pd.period_range(pd.Period(ordinal=first_month, freq='M'), periods=len(counts))
+    return pd.Series(percentage, index=month_ends.to_timestamp(how='end').normalize())
+
+
 # Calculate monthly average charge power availability, with an option to exclude SOE > 90%
 def calculate_charge_availability(df, rated_capacity=3300, exclude_high_soe=False):
     # Check if the PW_AvailableChargePower column is present
     if 'PW_AvailableChargePower' in df.columns:
-        # If excluding high SOE values, filter out rows where SOE > 90%
+        # If excluding high SOE values, filter out rows where SOE > 90%,
+        # selecting only the columns needed here before masking the rows
         if exclude_high_soe and 'SOE' in df.columns:
-            df = df[df['SOE'] <= 90].copy()
-        # Determine if the available charge power is greater than or equal to the rated capacity
-        df['is_available'] = (df['PW_AvailableChargePower'] >= rated_capacity)
-        # Forward fill availability values to handle any gaps
-        df['is_available'] = df['is_available'].ffill()
-        # Drop rows where availability calculation resulted in NaN
-        df.dropna(subset=['is_available'], inplace=True)
-        # Resample to calculate the monthly average availability in percentage
-        monthly_availability = df['is_available'].resample('ME').mean() * 100
+            df = df[['SOE', 'PW_AvailableChargePower']]
+            df = df[df['SOE'] <= 90]
+        else:
+            df = df[['PW_AvailableChargePower']]
+        # Determine if the available charge power is greater than or equal to the rated capacity;
+        # missing readings compare as False, i.e. unavailable, so no gap filling is needed
+        charge_power = df['PW_AvailableChargePower'].to_numpy(dtype=np.float32)
+        is_available = (charge_power >= np.float32(rated_capacity)).view(np.uint8)
+        # Calculate the monthly average availability in percentage
+        monthly_availability = monthly_percentage(df.index.to_period('M').asi8, is_available)
         return monthly_availability
     return None
 
 
+# Calculate monthly charge power availability both with and without SOE > 90% in one pass
+def compute_availabilities(df, rated_capacity=3300):
+    # Check if the PW_AvailableChargePower column is present
+    if 'PW_AvailableChargePower' not in df.columns:
+        return None, None
+    # Determine availability and the month of every row once, shared by both variants
+    charge_power = df['PW_AvailableChargePower'].to_numpy(dtype=np.float32)
+    is_available = (charge_power >= np.float32(rated_capacity)).view(np.uint8)
+    months = df.index.to_period('M').asi8
+    monthly_availability = monthly_percentage(months, is_available)
+    # Restrict the second reduction to rows where SOE <= 90%
+    if 'SOE' in df.columns:
+        low_soe = df['SOE'].to_numpy() <= 90
+        monthly_availability_excl = monthly_percentage(months[low_soe], is_available[low_soe])
+    else:
+        monthly_availability_excl = monthly_availability
+    return monthly_availability, monthly_availability_excl
+
+
+# Run the full pipeline for one battery file: load the data, calculate SOE and both availability metrics
+def process_battery(file_path):
+    # Load the battery data from CSV file
+    df = load_battery_data(file_path)
+    # Calculate State of Energy (SOE) for the battery
+    df = calculate_soe(df)
+    # Question 1 and 2: Calculate monthly charge power availability, also excluding SOE > 90%
+    availability, availability_excl = compute_availabilities(df)
+    return df, availability, availability_excl
+
+
+# Average the monthly availability of all batteries, ignoring months a battery has no data for
+def calculate_combined_availability(availability_dict):
+    availabilities = [availability for availability in availability_dict.values() if availability is not None]
+    if not availabilities:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+    # Align every battery on the union of their months
+    months = availabilities[0].index
+    for availability in availabilities[1:]:
+        months = months.union(availability.index)
+    # Accumulate a running sum and count per month instead of building a wide DataFrame
+    totals = np.zeros(len(months))
+    counts = np.zeros(len(months), dtype=np.int64)
+    for availability in availabilities:
+        values = availability.reindex(months).to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        np.add(totals, values, out=totals, where=present)
+        counts += present
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(totals / counts, index=months)
+
+
+# Format a month-end DatetimeIndex as 'YYYY-MM' labels using a vectorized period conversion
+def month_labels(index):
+    return index.to_period('M').astype(str)
+
+
+# Save the current figure as a PNG named after its title and release its memory
+def save_figure(title):
+    # Spell out characters that are not valid in file names on every platform
+    file_name = title.replace('>', 'greater than').replace('%', '')
+    plt.savefig(f'{file_name}.png', dpi=100)
+    plt.close('all')
+
+
 # Visualization function using seaborn
 def visualize_availability(availability, title):
     # Set the theme for the plot
     sns.set_theme(style="whitegrid")
     # Create a bar plot to visualize charge power availability
-    ax = sns.barplot(x=availability.index.strftime('%Y-%m'), y=availability.values, color='skyblue', errorbar=None)
+    ax = sns.barplot(x=month_labels(availability.index), y=availability.values, color='skyblue', errorbar=None)
     # Set plot title and labels
     ax.set_title(title)
     ax.set_xlabel('Month')
@@ -69,7 +292,7 @@ def visualize_availability(availability, title):
     # Rotate x-axis labels for better readability
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    save_figure(title)
 
 
 # Combined monthly availability heatmap
@@ -77,14 +300,14 @@ def visualize_combined_heatmap(availability_dict):
     # Create a DataFrame from the availability dictionary
     combined_df = pd.DataFrame(availability_dict)
     # Format index to only show year and month
-    combined_df.index = combined_df.index.strftime('%Y-%m')
+    combined_df.index = month_labels(combined_df.index)
     # Create a heatmap to visualize availability across all batteries
     sns.heatmap(combined_df, annot=True, cmap='coolwarm', fmt=".1f", linewidths=0.5)
     plt.title('Combined Monthly Availability Heatmap for All Batteries')
     plt.xlabel('Battery')
     plt.ylabel('Month')
     plt.tight_layout()
-    plt.show()
+    save_figure('Combined Monthly Availability Heatmap for All Batteries')
 
 
 # Line plot with Seaborn
@@ -100,41 +323,54 @@ def visualize_lineplot(availability_dict):
     plt.ylabel('Charge Power Availability (%)')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    save_figure('Monthly Charge Power Availability for All Batteries')
 
 
 # Distribution plot of SOE values
 def visualize_soe_distribution(df_list):
-    # Combine SOE values from all dataframes into a single series
-    combined_soe = pd.concat([df['SOE'] for df in df_list if 'SOE' in df.columns])
+    # Combine SOE values from all dataframes into a single preallocated float32 array
+    soe_columns = [df['SOE'].to_numpy(dtype=np.float32) for df in df_list if 'SOE' in df.columns]
+    combined_soe = np.empty(sum(len(soe) for soe in soe_columns), dtype=np.float32)
+    offset = 0
+    for soe in soe_columns:
+        combined_soe[offset:offset + len(soe)] = soe
+        offset += len(soe)
+    median_soe = np.median(combined_soe)
+    # A 30-bin histogram and KDE look the same on a random sample, so cap the plotted values
+    if len(combined_soe) > MAX_PLOT_SAMPLES:
+        combined_soe = np.random.default_rng(0).choice(combined_soe, MAX_PLOT_SAMPLES, replace=False)
     # Create a histogram with KDE to visualize the distribution of SOE values
-    sns.histplot(combined_soe, kde=True, bins=30, color='purple')
+    sns.histplot(combined_soe, kde=True, bins=30, stat='density', kde_kws={'gridsize': 256}, color='purple')
     plt.title('Distribution of State of Energy (SOE) Values')
     plt.xlabel('State of Energy (%)')
-    plt.ylabel('Frequency')
+    plt.ylabel('Density')
     # Add a vertical line to indicate the median SOE value
-    plt.axvline(combined_soe.median(), color='red', linestyle='--', linewidth=1.5, label='Median')
+    plt.axvline(median_soe, color='red', linestyle='--', linewidth=1.5, label='Median')
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    save_figure('Distribution of State of Energy (SOE) Values')
 
 
 # Individual box plots for each battery
 def visualize_individual_boxplots(availability_dict):
     # Create a DataFrame from the availability dictionary
     combined_df = pd.DataFrame(availability_dict)
-    # Generate individual box plots for each battery
-    for column in combined_df.columns:
-        plt.figure(figsize=(6, 5))
-        sns.boxplot(data=combined_df, y=column, width=0.5, color='lightblue')
-        plt.title(f'{column}')
-        plt.ylabel('Charge Power Availability (%)')
-        plt.tight_layout()
-        plt.show()
+    # Draw an individual box plot for each battery side by side in a single figure
+    fig, axes = plt.subplots(1, len(combined_df.columns), figsize=(4 * len(combined_df.columns), 5),
+                             sharey=True, squeeze=False)
+    for ax, column in zip(axes[0], combined_df.columns):
+        sns.boxplot(y=combined_df[column], ax=ax, width=0.5, color='lightblue')
+        ax.set_title(f'{column}')
+        ax.set_ylabel('Charge Power Availability (%)')
+    plt.tight_layout()
+    save_figure('Individual Box Plots for All Batteries')
 
 
 # Main program
 if __name__ == "__main__":
+    # Render figures off-screen and write them to PNG files instead of opening windows
+    matplotlib.use('Agg')
+
     # List of file paths for each battery's data
     battery_files = ["/001.csv","/002.csv","/003.csv","/004.csv","/005.csv"]
 
@@ -143,29 +379,25 @@ if __name__ == "__main__":
     # List to store DataFrames for each battery
     df_list = []
 
-    # Process each battery file
-    for i, file_path in enumerate(battery_files):
-        # Load the battery data from CSV file
-        df = load_battery_data(file_path)
-        # Calculate State of Energy (SOE) for the battery
-        df = calculate_soe(df)
-        df_list.append(df)
+    # Process the battery files in parallel, since each one is independent
+    if Parallel is not None:
+        results = Parallel(n_jobs=-1, backend='loky', batch_size=1)(
+            delayed(process_battery)(file_path) for file_path in battery_files)
+    else:
+        results = [process_battery(file_path) for file_path in battery_files]
 
-        # Question 1: Calculate monthly charge power availability
-        availability = calculate_charge_availability(df)
+    for i, (df, availability, availability_excl) in enumerate(results):
+        df_list.append(df)
         # Visualize monthly charge power availability for the battery
         visualize_availability(availability, f'Monthly Charge Power Availability for Battery {i + 1}')
-
-        # Question 2: Calculate and visualize charge power availability excluding SOE > 90%
-        availability_excl = calculate_charge_availability(df, exclude_high_soe=True)
+        # Visualize charge power availability excluding SOE > 90%
         visualize_availability(availability_excl, f'Monthly Charge Power Availability for Battery {i + 1} (Excluding SOE > 90%)')
-
         # Store the availability data for combined analysis
         availability_dict[f'Battery {i + 1}'] = availability_excl
 
     # Question 3: Combined analysis for all batteries
     # Calculate the combined monthly charge power availability across all batteries
-    combined_availability = pd.concat(availability_dict.values(), axis=1).mean(axis=1)
+    combined_availability = calculate_combined_availability(availability_dict)
     visualize_availability(combined_availability, 'Combined Monthly Charge Power Availability for All Batteries (Excluding SOE > 90%)')
 
     # Additional visualizations